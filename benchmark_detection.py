@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# Compares per-event detection latency of the old fixed-order inline checks
+# against the cost-ordered pipeline with early exit and an offloaded model.
+#
+#   python benchmark_detection.py --events 300 --model-ms 20 --deadline-ms 30
+import argparse
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import simple_app
+from simple_app import (
+    DetectionPipeline, AnomalyStage, PortStage, AISimulationStage, PatternStage,
+    MLModelStage, DummyMLModel, make_executor, SHORT_CIRCUIT_SEVERITY,
+    DETECTION_WORKERS, DETECTION_MAX_IN_FLIGHT
+)
+
+# Stand-in for a real model: same verdicts as DummyMLModel, but inference
+# takes time with a long tail, like a network or GPU call would.
+class SlowModel(DummyMLModel):
+    def __init__(self, mean_ms):
+        self.mean_ms = mean_ms
+
+    def predict(self, features):
+        time.sleep(random.expovariate(1.0 / self.mean_ms) / 1000.0)
+        return super().predict(features)
+
+def make_events(count, malicious_ratio):
+    benign = {'user_agent': 'Mozilla/5.0', 'request_method': 'GET', 'url': '/index.html', 'port': 443}
+    malicious = {'user_agent': 'sqlmap/1.7', 'request_method': 'GET', 'url': '/?q=1 union select', 'port': 3306}
+    events = []
+    for i in range(count):
+        event = dict(malicious if random.random() < malicious_ratio else benign)
+        event['source_ip'] = f"10.0.{i // 256}.{i % 256}"
+        events.append(event)
+    return events
+
+def make_stages(model):
+    detector = simple_app.SimpleThreatDetector()
+    return [
+        AnomalyStage(),
+        PortStage(detector.suspicious_ports),
+        AISimulationStage(),
+        PatternStage(detector.suspicious_patterns, detector.critical_patterns),
+        MLModelStage(model),
+    ]
+
+def timed_run(pipeline, event):
+    start = time.perf_counter()
+    _, report = pipeline.run(event)
+    return (time.perf_counter() - start) * 1000.0, report
+
+# Replays the events from `clients` concurrent callers, like request threads.
+def measure(pipeline, events, clients=1):
+    with ThreadPoolExecutor(max_workers=clients) as callers:
+        results = list(callers.map(lambda event: timed_run(pipeline, event), events))
+    return [r[0] for r in results], [r[1] for r in results]
+
+# Latency alone hides what the pipeline gave up to get it, so report how many
+# events left the response without a model verdict (deferred to the
+# background), stopped early, had the model shed by the in-flight cap, or
+# had an offloaded stage fail.
+def summarize(label, latencies, reports):
+    ordered = sorted(latencies)
+    p = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    deferred = sum(1 for r in reports if r['pending'])
+    short_circuited = sum(1 for r in reports if r['short_circuited_by'])
+    shed = sum(1 for r in reports if 'ml_model' in r['skipped'] and not r['short_circuited_by'])
+    failed = sum(1 for r in reports if r['failed'])
+    model_calls = sum(1 for r in reports if 'ml_model' not in r['skipped'])
+    verdicts = sum(1 for r in reports if 'ml_model' in r['completed'])
+    print(f"{label:<10} mean={statistics.mean(ordered):7.2f}ms  p50={p(0.50):7.2f}ms  "
+          f"p95={p(0.95):7.2f}ms  p99={p(0.99):7.2f}ms  max={ordered[-1]:7.2f}ms  "
+          f"deferred={deferred}/{len(reports)}  short_circuited={short_circuited}  shed={shed}  failed={failed}")
+    print(f"{'':<10} model calls={model_calls}/{len(reports)}  "
+          f"responses with model verdict={verdicts}/{len(reports)}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Detection latency benchmark')
+    parser.add_argument('--events', type=int, default=300)
+    parser.add_argument('--model-ms', type=float, default=20.0, help='mean simulated model latency')
+    parser.add_argument('--deadline-ms', type=float, default=30.0)
+    parser.add_argument('--malicious-ratio', type=float, default=0.3)
+    parser.add_argument('--short-circuit-severity', default=SHORT_CIRCUIT_SEVERITY)
+    parser.add_argument('--executor', choices=['thread', 'process'], default='thread')
+    parser.add_argument('--workers', type=int, default=DETECTION_WORKERS)
+    parser.add_argument('--max-in-flight', type=int, default=DETECTION_MAX_IN_FLIGHT)
+    parser.add_argument('--clients', type=int, default=1, help='concurrent callers')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    events = make_events(args.events, args.malicious_ratio)
+    model = SlowModel(args.model_ms)
+
+    baseline = DetectionPipeline(make_stages(model), executor=None,
+                                 deadline_ms=float('inf'), short_circuit_severity=None)
+    executor = make_executor(args.executor, args.workers)
+    pipeline = DetectionPipeline(make_stages(model), executor=executor,
+                                 deadline_ms=args.deadline_ms,
+                                 short_circuit_severity=args.short_circuit_severity,
+                                 max_in_flight=args.max_in_flight)
+
+    print(f"{args.events} events, {args.malicious_ratio:.0%} malicious, model mean {args.model_ms}ms, "
+          f"deadline {args.deadline_ms}ms, short-circuit at {args.short_circuit_severity}, "
+          f"{args.executor} pool of {args.workers}, max {args.max_in_flight} in flight, {args.clients} clients")
+    summarize('inline', *measure(baseline, events, args.clients))
+    summarize('pipeline', *measure(pipeline, events, args.clients))
+    executor.shutdown(wait=True)
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
 import os
+import math
 import json
+import logging
 import time
 import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime, timedelta
 from flask import Flask, request, jsonify, session, render_template
 from flask_cors import CORS
@@ -40,33 +44,149 @@ class DummyMLModel:
 ml_model = DummyMLModel()
 
 # Threat Detection Logic
-class SimpleThreatDetector:
-    def __init__(self):
-        self.suspicious_patterns = [
-            'sql injection', 'sqlmap', 'xss', 'command injection', 'path traversal',
-            'buffer overflow', 'privilege escalation', 'brute force', 'ddos',
-            'script', 'alert', 'union select', 'drop table', 'insert into',
-            ';', '&&', '|', 'wget', 'curl', 'python', 'bash', 'sh',
-            '../', '/etc/passwd', 'boot.ini', 'http://169.254.169.254',
-            'file://', 'gopher://'
-        ]
-        self.suspicious_ports = [22, 23, 3389, 445, 1433, 3306, 5432]
+SEVERITY_RANK = {'low': 0, 'medium': 1, 'high': 2, 'critical': 3}
 
-    def detect_threats(self, data):
-        global threat_counter
-        threats = []
+# Normalises a severity name, failing loudly so a typo cannot silently
+# disable early exit. None stays None (short-circuiting off).
+def parse_severity(value):
+    if value is None:
+        return None
+    severity = str(value).strip().lower()
+    if severity not in SEVERITY_RANK:
+        raise ValueError(f"Unknown severity {value!r}; expected one of {', '.join(SEVERITY_RANK)}")
+    return severity
+
+DETECTION_DEADLINE_MS = float(os.getenv('DETECTION_DEADLINE_MS', '50'))
+MAX_DEADLINE_FACTOR = 4
+SHORT_CIRCUIT_SEVERITY = parse_severity(os.getenv('SHORT_CIRCUIT_SEVERITY', 'critical'))
+DETECTION_EXECUTOR = os.getenv('DETECTION_EXECUTOR', 'thread')
+DETECTION_WORKERS = int(os.getenv('DETECTION_WORKERS', '4'))
+DETECTION_MAX_IN_FLIGHT = int(os.getenv('DETECTION_MAX_IN_FLIGHT', str(DETECTION_WORKERS * 2)))
+logger = logging.getLogger(__name__)
+
+threat_lock = threading.Lock()
+
+def next_threat_id():
+    global threat_counter
+    with threat_lock:
+        threat_counter += 1
+        return f"threat_{threat_counter}_{int(time.time()*1000)}"
+
+# Detector stages. Each declares its relative cost, whether a severe finding
+# from it may stop the remaining stages, and whether it is offloaded to the
+# executor. Only content detectors short-circuit, so a rate signal such as
+# AnomalyStage never hides payload evidence from later stages. Stages that
+# keep per-source state set always_run so a short-circuit does not skip
+# their bookkeeping. Offloaded stages split their work into compute() (runs
+# in the pool, must be picklable for a process pool) and findings() (runs
+# locally).
+class DetectorStage:
+    name = 'stage'
+    cost = 1
+    short_circuit = False
+    always_run = False
+    offload = False
+
+    def compute(self, data):
+        return None
+
+    def findings(self, data, result):
+        return []
+
+    def run(self, data):
+        return self.findings(data, self.compute(data))
+
+class AnomalyStage(DetectorStage):
+    name = 'anomaly_detection'
+    cost = 1
+    always_run = True
+
+    def findings(self, data, result):
+        ip = data.get('source_ip')
+        if not ip:
+            return []
+        now = time.time()
+        with threat_lock:
+            ip_request_counts[ip] = [t for t in ip_request_counts[ip] if now - t < ANOMALY_WINDOW_SECONDS]
+            ip_request_counts[ip].append(now)
+            count = len(ip_request_counts[ip])
+        if count <= ANOMALY_THRESHOLD:
+            return []
+        return [{
+            'id': next_threat_id(),
+            'type': 'anomaly_detected',
+            'severity': 'high',
+            'confidence': 0.95,
+            'detection_method': 'anomaly_detection',
+            'description': f"{count} reqs in {ANOMALY_WINDOW_SECONDS}s",
+            'timestamp': datetime.utcnow().isoformat(),
+            'source_ip': ip,
+            'raw_data': data
+        }]
+
+class PortStage(DetectorStage):
+    name = 'port_analysis'
+    cost = 1
+
+    def __init__(self, suspicious_ports):
+        self.suspicious_ports = suspicious_ports
+
+    def findings(self, data, result):
+        if 'port' not in data or data['port'] not in self.suspicious_ports:
+            return []
+        return [{
+            'id': next_threat_id(),
+            'type': 'suspicious_port',
+            'severity': 'medium',
+            'confidence': 0.7,
+            'detection_method': 'port_analysis',
+            'description': f"Suspicious port {data['port']}",
+            'timestamp': datetime.utcnow().isoformat(),
+            'source_ip': data.get('source_ip'),
+            'raw_data': data
+        }]
 
+class AISimulationStage(DetectorStage):
+    name = 'ai_model'
+    cost = 2
+
+    def findings(self, data, result):
+        if random.random() >= 0.3:
+            return []
+        return [{
+            'id': next_threat_id(),
+            'type': 'ai_detected_threat',
+            'severity': random.choice(['low', 'medium', 'high']),
+            'confidence': round(random.uniform(0.5, 0.95), 2),
+            'detection_method': 'ai_model',
+            'description': "AI model detected threat",
+            'timestamp': datetime.utcnow().isoformat(),
+            'source_ip': data.get('source_ip'),
+            'raw_data': data
+        }]
+
+class PatternStage(DetectorStage):
+    name = 'pattern_matching'
+    cost = 3
+    short_circuit = True
+
+    def __init__(self, suspicious_patterns, critical_patterns=()):
+        self.suspicious_patterns = suspicious_patterns
+        self.critical_patterns = set(critical_patterns)
+
+    def findings(self, data, result):
+        threats = []
         for field in ['user_agent', 'request_method', 'message', 'url']:
             if field in data:
                 value = str(data[field]).lower()
                 for pattern in self.suspicious_patterns:
                     if pattern in value:
-                        threat_counter += 1
+                        critical = pattern in self.critical_patterns
                         threats.append({
-                            'id': f"threat_{threat_counter}_{int(time.time()*1000)}",
+                            'id': next_threat_id(),
                             'type': 'suspicious_pattern',
-                            'severity': 'high',
-                            'confidence': 0.9,
+                            'severity': 'critical' if critical else 'high',
+                            'confidence': 0.95 if critical else 0.9,
                             'detection_method': 'pattern_matching',
                             'description': f"Pattern '{pattern}' in {field}",
                             'timestamp': datetime.utcnow().isoformat(),
@@ -75,71 +195,205 @@ class SimpleThreatDetector:
                             'source_ip': data.get('source_ip'),
                             'raw_data': data
                         })
+        return threats
 
-        if 'port' in data and data['port'] in self.suspicious_ports:
-            threat_counter += 1
-            threats.append({
-                'id': f"threat_{threat_counter}_{int(time.time()*1000)}",
-                'type': 'suspicious_port',
-                'severity': 'medium',
-                'confidence': 0.7,
-                'detection_method': 'port_analysis',
-                'description': f"Suspicious port {data['port']}",
-                'timestamp': datetime.utcnow().isoformat(),
-                'source_ip': data.get('source_ip'),
-                'raw_data': data
-            })
-
-        if ml_model.predict(data) == 1:
-            threat_counter += 1
-            threats.append({
-                'id': f"threat_{threat_counter}_{int(time.time()*1000)}",
-                'type': 'ml_detected_threat',
-                'severity': 'medium',
-                'confidence': 0.8,
-                'detection_method': 'ml_model',
-                'description': "ML model flagged this",
-                'timestamp': datetime.utcnow().isoformat(),
-                'source_ip': data.get('source_ip'),
-                'raw_data': data
-            })
+class MLModelStage(DetectorStage):
+    name = 'ml_model'
+    cost = 10
+    offload = True
 
-        ip = data.get('source_ip')
-        now = time.time()
-        if ip:
-            ip_request_counts[ip] = [t for t in ip_request_counts[ip] if now - t < ANOMALY_WINDOW_SECONDS]
-            ip_request_counts[ip].append(now)
-            if len(ip_request_counts[ip]) > ANOMALY_THRESHOLD:
-                threat_counter += 1
-                threats.append({
-                    'id': f"threat_{threat_counter}_{int(time.time()*1000)}",
-                    'type': 'anomaly_detected',
-                    'severity': 'high',
-                    'confidence': 0.95,
-                    'detection_method': 'anomaly_detection',
-                    'description': f"{len(ip_request_counts[ip])} reqs in {ANOMALY_WINDOW_SECONDS}s",
-                    'timestamp': datetime.utcnow().isoformat(),
-                    'source_ip': ip,
-                    'raw_data': data
-                })
-
-        if random.random() < 0.3:
-            threat_counter += 1
-            threats.append({
-                'id': f"threat_{threat_counter}_{int(time.time()*1000)}",
-                'type': 'ai_detected_threat',
-                'severity': random.choice(['low', 'medium', 'high']),
-                'confidence': round(random.uniform(0.5, 0.95), 2),
-                'detection_method': 'ai_model',
-                'description': "AI model detected threat",
-                'timestamp': datetime.utcnow().isoformat(),
-                'source_ip': data.get('source_ip'),
-                'raw_data': data
-            })
+    def __init__(self, model):
+        self.model = model
+
+    def compute(self, data):
+        return self.model.predict(data)
+
+    def findings(self, data, result):
+        if result != 1:
+            return []
+        return [{
+            'id': next_threat_id(),
+            'type': 'ml_detected_threat',
+            'severity': 'medium',
+            'confidence': 0.8,
+            'detection_method': 'ml_model',
+            'description': "ML model flagged this",
+            'timestamp': datetime.utcnow().isoformat(),
+            'source_ip': data.get('source_ip'),
+            'raw_data': data
+        }]
+
+def make_executor(kind=DETECTION_EXECUTOR, workers=DETECTION_WORKERS):
+    if kind == 'process':
+        return ProcessPoolExecutor(max_workers=workers)
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='detector')
+
+# Runs short-circuiting stages first, cheapest first, and only then submits
+# offloaded stages, so an event already decided by a cheap content check never
+# pays for the model. The remaining inline stages run while offloaded ones are
+# in flight; the per-event deadline only bounds how long offloaded stages are
+# awaited. Findings from those that miss it reach on_late_findings later.
+# At most max_in_flight offloaded calls may be queued or running; beyond that
+# the stage is skipped for the event rather than queued behind a backlog.
+class DetectionPipeline:
+    def __init__(self, stages, executor=None, deadline_ms=DETECTION_DEADLINE_MS,
+                 short_circuit_severity=SHORT_CIRCUIT_SEVERITY, on_late_findings=None,
+                 max_in_flight=DETECTION_MAX_IN_FLIGHT):
+        self.stages = sorted(stages, key=lambda s: (not s.short_circuit, s.cost))
+        self.executor = executor
+        self.deadline_ms = deadline_ms
+        short_circuit_severity = parse_severity(short_circuit_severity)
+        self.short_circuit_rank = SEVERITY_RANK[short_circuit_severity] if short_circuit_severity else None
+        self.on_late_findings = on_late_findings
+        self.max_in_flight = max_in_flight
+        self.in_flight = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+
+    def _stops(self, stage, threats):
+        if not stage.short_circuit or self.short_circuit_rank is None:
+            return False
+        return any(SEVERITY_RANK.get(t['severity'], 0) >= self.short_circuit_rank for t in threats)
 
+    def _submit(self, stage, data):
+        if self.in_flight is not None and not self.in_flight.acquire(blocking=False):
+            return None
+        try:
+            future = self.executor.submit(stage.compute, data)
+        except Exception:
+            if self.in_flight is not None:
+                self.in_flight.release()
+            raise
+        if self.in_flight is not None:
+            future.add_done_callback(lambda f: self.in_flight.release())
+        return future
+
+    def _attach_late(self, stage, data, future):
+        def done(f):
+            if f.cancelled():
+                return
+            try:
+                threats = stage.findings(data, f.result())
+            except Exception:
+                logger.exception("Detector stage %s failed", stage.name)
+                return
+            if threats and self.on_late_findings:
+                self.on_late_findings(threats)
+        future.add_done_callback(done)
+
+    def run(self, data, deadline_ms=None):
+        deadline_ms = self.deadline_ms if deadline_ms is None else deadline_ms
+        deadline = time.perf_counter() + deadline_ms / 1000.0
+        threats = []
+        report = {'completed': [], 'pending': [], 'skipped': [], 'failed': [], 'short_circuited_by': None}
+
+        offloaded = [s for s in self.stages if s.offload and self.executor is not None]
+        inline = [s for s in self.stages if s not in offloaded]
+        gates = [s for s in inline if s.short_circuit]
+        rest = [s for s in inline if not s.short_circuit]
+
+        ran = set()
+        for stage in gates:
+            found = stage.run(data)
+            threats.extend(found)
+            report['completed'].append(stage.name)
+            ran.add(stage)
+            if self._stops(stage, found):
+                report['short_circuited_by'] = stage.name
+                break
+
+        if report['short_circuited_by'] is not None:
+            for stage in self.stages:
+                if stage in ran:
+                    continue
+                if stage.always_run and stage not in offloaded:
+                    threats.extend(stage.run(data))
+                    report['completed'].append(stage.name)
+                else:
+                    report['skipped'].append(stage.name)
+            return threats, report
+
+        pending = {}
+        for stage in offloaded:
+            future = self._submit(stage, data)
+            if future is None:
+                logger.debug("Detector stage %s skipped: %d calls already in flight", stage.name, self.max_in_flight)
+                report['skipped'].append(stage.name)
+            else:
+                pending[stage] = future
+
+        for stage in rest:
+            threats.extend(stage.run(data))
+            report['completed'].append(stage.name)
+
+        for stage, future in pending.items():
+            try:
+                result = future.result(timeout=max(0.0, deadline - time.perf_counter()))
+                found = stage.findings(data, result)
+            except FutureTimeoutError:
+                pass
+            except Exception:
+                logger.exception("Detector stage %s failed", stage.name)
+                report['failed'].append(stage.name)
+                continue
+            else:
+                threats.extend(found)
+                report['completed'].append(stage.name)
+                continue
+            report['pending'].append(stage.name)
+            self._attach_late(stage, data, future)
+
+        return threats, report
+
+class SimpleThreatDetector:
+    def __init__(self, executor=None, on_late_findings=None):
+        self.suspicious_patterns = [
+            'sql injection', 'sqlmap', 'xss', 'command injection', 'path traversal',
+            'buffer overflow', 'privilege escalation', 'brute force', 'ddos',
+            'script', 'alert', 'union select', 'drop table', 'insert into',
+            ';', '&&', '|', 'wget', 'curl', 'python', 'bash', 'sh',
+            '../', '/etc/passwd', 'boot.ini', 'http://169.254.169.254',
+            'file://', 'gopher://'
+        ]
+        # Unambiguous attack signatures; a hit is a critical verdict on its own.
+        self.critical_patterns = [
+            'union select', 'drop table', '/etc/passwd', 'http://169.254.169.254'
+        ]
+        self.suspicious_ports = [22, 23, 3389, 445, 1433, 3306, 5432]
+        self.pipeline = DetectionPipeline([
+            AnomalyStage(),
+            PortStage(self.suspicious_ports),
+            AISimulationStage(),
+            PatternStage(self.suspicious_patterns, self.critical_patterns),
+            MLModelStage(ml_model),
+        ], executor=executor, on_late_findings=on_late_findings)
+
+    def analyze(self, data, deadline_ms=None):
+        return self.pipeline.run(data, deadline_ms)
+
+    def detect_threats(self, data, deadline_ms=None):
+        threats, _ = self.analyze(data, deadline_ms)
         return threats
 
-threat_detector = SimpleThreatDetector()
+# Per-request deadline override, capped server-side. Returns None if invalid.
+def parse_deadline_ms(value):
+    try:
+        deadline_ms = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(deadline_ms) or deadline_ms <= 0:
+        return None
+    return min(deadline_ms, DETECTION_DEADLINE_MS * MAX_DEADLINE_FACTOR)
+
+def record_threats(threats):
+    with threat_lock:
+        for threat in threats:
+            threats_database.append(threat)
+            analytics_data['total_threats'] += 1
+            analytics_data['threats_by_severity'][threat['severity']] += 1
+            ttype = threat['type']
+            analytics_data['threats_by_type'][ttype] = analytics_data['threats_by_type'].get(ttype, 0) + 1
+        analytics_data['last_updated'] = datetime.utcnow().isoformat()
+
+threat_detector = SimpleThreatDetector(executor=make_executor(), on_late_findings=record_threats)
 
 # HTML Route
 @app.route('/')
@@ -153,17 +407,17 @@ def detect_threats():
         data = request.get_json()
         if not data:
             return jsonify({'error': 'No data provided'}), 400
-        threats = threat_detector.detect_threats(data)
-        for threat in threats:
-            threats_database.append(threat)
-            analytics_data['total_threats'] += 1
-            analytics_data['threats_by_severity'][threat['severity']] += 1
-            ttype = threat['type']
-            analytics_data['threats_by_type'][ttype] = analytics_data['threats_by_type'].get(ttype, 0) + 1
-        analytics_data['last_updated'] = datetime.utcnow().isoformat()
+        deadline_ms = None
+        if 'deadline_ms' in request.args:
+            deadline_ms = parse_deadline_ms(request.args['deadline_ms'])
+            if deadline_ms is None:
+                return jsonify({'error': 'deadline_ms must be a positive number'}), 400
+        threats, report = threat_detector.analyze(data, deadline_ms)
+        record_threats(threats)
         return jsonify({
             'threats_detected': len(threats),
             'threats': threats,
+            'stages': report,
             'timestamp': datetime.utcnow().isoformat()
         })
     except Exception as e:
@@ -171,25 +425,33 @@ def detect_threats():
 
 @app.route('/api/threats', methods=['GET'])
 def get_threats():
+    with threat_lock:
+        threats = list(threats_database)
     return jsonify({
-        'threats': threats_database,
-        'total': len(threats_database),
+        'threats': threats,
+        'total': len(threats),
         'timestamp': datetime.utcnow().isoformat()
     })
 
 @app.route('/api/threats/<threat_id>', methods=['DELETE'])
 def delete_threat(threat_id):
-    for i, threat in enumerate(threats_database):
-        if threat.get('id') == threat_id:
-            threats_database.pop(i)
-            analytics_data['total_threats'] -= 1
-            return jsonify({'message': 'Threat deleted successfully'})
+    with threat_lock:
+        for i, threat in enumerate(threats_database):
+            if threat.get('id') == threat_id:
+                threats_database.pop(i)
+                analytics_data['total_threats'] -= 1
+                return jsonify({'message': 'Threat deleted successfully'})
     return jsonify({'error': 'Threat not found'}), 404
 
 @app.route('/api/analytics', methods=['GET'])
 def get_analytics():
+    with threat_lock:
+        threats = list(threats_database)
+        total_threats = analytics_data['total_threats']
+        threats_by_severity = dict(analytics_data['threats_by_severity'])
+        threats_by_type = dict(analytics_data['threats_by_type'])
     recent_threats = [
-        t for t in threats_database
+        t for t in threats
         if datetime.fromisoformat(t['timestamp']) > datetime.utcnow() - timedelta(hours=24)
     ]
     return jsonify({
@@ -199,10 +461,10 @@ def get_analytics():
             'duration_hours': 24
         },
         'threat_analytics': {
-            'total_threats': analytics_data['total_threats'],
+            'total_threats': total_threats,
             'threats_24h': len(recent_threats),
-            'threats_by_severity': analytics_data['threats_by_severity'],
-            'threats_by_type': analytics_data['threats_by_type'],
+            'threats_by_severity': threats_by_severity,
+            'threats_by_type': threats_by_type,
             'avg_confidence': 0.75
         },
         'system_health': {
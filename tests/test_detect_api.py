@@ -0,0 +1,58 @@
+import pytest
+
+import simple_app
+
+
+@pytest.fixture
+def client():
+    return simple_app.app.test_client()
+
+
+@pytest.mark.parametrize('value', ['0', '-5', 'nan', 'inf', 'abc'])
+def test_invalid_deadline_is_rejected(client, value):
+    response = client.post(f'/api/detect?deadline_ms={value}',
+                           json={'message': 'sqlmap', 'source_ip': '10.9.0.1'})
+    assert response.status_code == 400
+
+
+def test_deadline_is_capped():
+    cap = simple_app.DETECTION_DEADLINE_MS * simple_app.MAX_DEADLINE_FACTOR
+    assert simple_app.parse_deadline_ms(str(cap * 10)) == cap
+    assert simple_app.parse_deadline_ms('5') == 5.0
+
+
+def test_flooding_ip_still_records_patterns(client):
+    payload = {'message': 'sqlmap', 'port': 3306, 'source_ip': '10.9.0.2'}
+    for _ in range(simple_app.ANOMALY_THRESHOLD + 1):
+        response = client.post('/api/detect?deadline_ms=1', json=payload)
+
+    types = {t['type'] for t in response.get_json()['threats']}
+    assert {'anomaly_detected', 'suspicious_pattern', 'suspicious_port'} <= types
+
+
+def test_critical_payload_short_circuits():
+    payload = {'url': '/?q=1 union select password from users', 'source_ip': '10.9.0.3'}
+
+    threats, report = simple_app.threat_detector.analyze(payload)
+
+    assert report['short_circuited_by'] == 'pattern_matching'
+    assert any(t['type'] == 'suspicious_pattern' and t['severity'] == 'critical' for t in threats)
+
+
+def test_non_critical_payload_does_not_short_circuit():
+    payload = {'user_agent': 'curl/8.0', 'source_ip': '10.9.0.4'}
+
+    threats, report = simple_app.threat_detector.analyze(payload)
+
+    assert report['short_circuited_by'] is None
+    assert all(t['severity'] != 'critical' for t in threats)
+
+
+def test_short_circuit_skips_model_and_keeps_rate_tracking():
+    payload = {'url': '/../../etc/passwd', 'port': 3306, 'source_ip': '10.9.0.5'}
+
+    _, report = simple_app.threat_detector.analyze(payload)
+
+    assert report['completed'] == ['pattern_matching', 'anomaly_detection']
+    assert set(report['skipped']) == {'port_analysis', 'ai_model', 'ml_model'}
+    assert len(simple_app.ip_request_counts['10.9.0.5']) == 1
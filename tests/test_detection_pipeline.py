@@ -0,0 +1,216 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from simple_app import DetectionPipeline, DetectorStage
+
+
+class StubStage(DetectorStage):
+    def __init__(self, name, cost=1, severity=None, short_circuit=False,
+                 offload=False, delay=0.0, error=None):
+        self.name = name
+        self.cost = cost
+        self.severity = severity
+        self.short_circuit = short_circuit
+        self.offload = offload
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def compute(self, data):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.severity
+
+    def findings(self, data, result):
+        if result is None:
+            return []
+        return [{'type': self.name, 'severity': result}]
+
+
+@pytest.fixture
+def executor():
+    pool = ThreadPoolExecutor(max_workers=2)
+    yield pool
+    pool.shutdown(wait=True)
+
+
+def test_short_circuit_skips_later_inline_stages():
+    first = StubStage('first', cost=1, severity='critical', short_circuit=True)
+    later = StubStage('later', cost=2, severity='low')
+    pipeline = DetectionPipeline([later, first], short_circuit_severity='critical')
+
+    threats, report = pipeline.run({})
+
+    assert [t['type'] for t in threats] == ['first']
+    assert report['short_circuited_by'] == 'first'
+    assert report['skipped'] == ['later']
+    assert later.calls == 0
+
+
+def test_below_threshold_does_not_short_circuit():
+    first = StubStage('first', cost=1, severity='high', short_circuit=True)
+    later = StubStage('later', cost=2, severity='low')
+    pipeline = DetectionPipeline([first, later], short_circuit_severity='critical')
+
+    threats, report = pipeline.run({})
+
+    assert report['short_circuited_by'] is None
+    assert report['completed'] == ['first', 'later']
+    assert len(threats) == 2
+
+
+def test_offloaded_stage_past_deadline_is_pending_and_attached_late(executor):
+    late = []
+    arrived = threading.Event()
+
+    def on_late_findings(threats):
+        late.extend(threats)
+        arrived.set()
+
+    cheap = StubStage('cheap', cost=1, severity='low')
+    slow = StubStage('slow', cost=10, severity='medium', offload=True, delay=0.2)
+    pipeline = DetectionPipeline([cheap, slow], executor=executor, deadline_ms=10,
+                                 on_late_findings=on_late_findings)
+
+    threats, report = pipeline.run({})
+
+    assert [t['type'] for t in threats] == ['cheap']
+    assert report['completed'] == ['cheap']
+    assert report['pending'] == ['slow']
+    assert arrived.wait(timeout=2)
+    assert late == [{'type': 'slow', 'severity': 'medium'}]
+
+
+def test_offloaded_stage_within_deadline_is_included(executor):
+    slow = StubStage('slow', cost=10, severity='medium', offload=True, delay=0.01)
+    pipeline = DetectionPipeline([slow], executor=executor, deadline_ms=2000)
+
+    threats, report = pipeline.run({})
+
+    assert threats == [{'type': 'slow', 'severity': 'medium'}]
+    assert report['completed'] == ['slow']
+    assert report['pending'] == []
+
+
+def test_inline_stages_run_even_when_deadline_has_passed(executor):
+    cheap = StubStage('cheap', cost=1, severity='low')
+    slow = StubStage('slow', cost=10, severity='medium', offload=True, delay=0.2)
+    pipeline = DetectionPipeline([cheap, slow], executor=executor)
+
+    threats, report = pipeline.run({}, deadline_ms=0)
+
+    assert report['completed'] == ['cheap']
+    assert report['skipped'] == []
+    assert [t['type'] for t in threats] == ['cheap']
+
+
+def test_offloaded_exception_is_reported_as_failed(executor):
+    cheap = StubStage('cheap', cost=1, severity='low')
+    broken = StubStage('broken', cost=10, offload=True, error=RuntimeError('model down'))
+    pipeline = DetectionPipeline([cheap, broken], executor=executor, deadline_ms=2000)
+
+    threats, report = pipeline.run({})
+
+    assert [t['type'] for t in threats] == ['cheap']
+    assert report['failed'] == ['broken']
+    assert report['completed'] == ['cheap']
+
+
+def test_late_offloaded_exception_does_not_reach_on_late_findings(executor, caplog):
+    late = []
+    broken = StubStage('broken', cost=10, offload=True, delay=0.05,
+                       error=RuntimeError('model down'))
+    pipeline = DetectionPipeline([broken], executor=executor, deadline_ms=1,
+                                 on_late_findings=late.extend)
+
+    _, report = pipeline.run({})
+    executor.shutdown(wait=True)
+
+    assert report['pending'] == ['broken']
+    assert late == []
+    assert 'Detector stage broken failed' in caplog.text
+
+
+def test_no_executor_runs_everything_inline():
+    cheap = StubStage('cheap', cost=1, severity='low')
+    model = StubStage('model', cost=10, severity='medium', offload=True, delay=0.05)
+    pipeline = DetectionPipeline([model, cheap], executor=None, deadline_ms=1)
+
+    threats, report = pipeline.run({})
+
+    assert report['completed'] == ['cheap', 'model']
+    assert report['pending'] == []
+    assert [t['type'] for t in threats] == ['cheap', 'model']
+
+
+def test_short_circuit_severity_is_normalised():
+    first = StubStage('first', cost=1, severity='critical', short_circuit=True)
+    later = StubStage('later', cost=2, severity='low')
+    pipeline = DetectionPipeline([first, later], short_circuit_severity=' Critical ')
+
+    _, report = pipeline.run({})
+
+    assert report['short_circuited_by'] == 'first'
+
+
+@pytest.mark.parametrize('value', ['crit', 'severe', ''])
+def test_unknown_short_circuit_severity_is_rejected(value):
+    with pytest.raises(ValueError):
+        DetectionPipeline([], short_circuit_severity=value)
+
+
+def test_short_circuit_never_submits_offloaded_stages(executor):
+    gate = StubStage('gate', cost=5, severity='critical', short_circuit=True)
+    cheap = StubStage('cheap', cost=1, severity='low')
+    model = StubStage('model', cost=10, severity='medium', offload=True)
+    pipeline = DetectionPipeline([cheap, model, gate], executor=executor,
+                                 short_circuit_severity='critical')
+
+    threats, report = pipeline.run({})
+
+    assert report['completed'] == ['gate']
+    assert report['skipped'] == ['cheap', 'model']
+    assert report['pending'] == []
+    assert model.calls == 0
+    assert cheap.calls == 0
+
+
+def test_always_run_stage_runs_after_short_circuit():
+    gate = StubStage('gate', cost=5, severity='critical', short_circuit=True)
+    tracker = StubStage('tracker', cost=1, severity='high')
+    tracker.always_run = True
+    pipeline = DetectionPipeline([tracker, gate], short_circuit_severity='critical')
+
+    threats, report = pipeline.run({})
+
+    assert report['completed'] == ['gate', 'tracker']
+    assert [t['type'] for t in threats] == ['gate', 'tracker']
+
+
+def test_offloaded_stage_is_skipped_when_in_flight_cap_is_full(executor):
+    slow = StubStage('slow', cost=10, severity='medium', offload=True, delay=0.2)
+    pipeline = DetectionPipeline([slow], executor=executor, deadline_ms=1, max_in_flight=1)
+
+    _, first = pipeline.run({})
+    _, second = pipeline.run({})
+
+    assert first['pending'] == ['slow']
+    assert second['skipped'] == ['slow']
+    assert slow.calls == 1
+
+
+def test_in_flight_slot_is_released_when_stage_finishes(executor):
+    fast = StubStage('fast', cost=10, severity='medium', offload=True)
+    pipeline = DetectionPipeline([fast], executor=executor, deadline_ms=2000, max_in_flight=1)
+
+    for _ in range(3):
+        _, report = pipeline.run({})
+        assert report['completed'] == ['fast']
+        # The slot is released by a done-callback that may fire just after result().
+        time.sleep(0.05)